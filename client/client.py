@@ -1,8 +1,8 @@
 import argparse
 import logging
 import asyncio
-import queue
-import multiprocessing as mp
+import concurrent.futures
+import struct
 import cv2 as cv
 import numpy as np
 from aiortc import (
@@ -14,9 +14,33 @@ from aiortc import (
 from aiortc.contrib.signaling import TcpSocketSignaling, BYE
 from aiortc.contrib.media import MediaRelay
 
+COORDINATE_FORMAT = "<ii"
+COORDINATE_QUEUE_SIZE = 8
+# stop handing coordinates to a congested channel once this many bytes are waiting to be sent
+MAX_BUFFERED_AMOUNT = COORDINATE_QUEUE_SIZE * struct.calcsize(COORDINATE_FORMAT)
+BALL_COLOR_LOWER = np.array([0, 0, 200], dtype=np.uint8)
+BALL_COLOR_UPPER = np.array([80, 80, 255], dtype=np.uint8)
+
 logger = logging.getLogger("client")
 
 
+def detect_center(image):
+    """
+    Detect the center of the ball in the image
+    Args:
+        image: The image (ndarray) object
+    Returns:
+        (x, y) -> Tuple representing the center of ball
+    """
+    # the ball is a known solid red, so a color mask and its centroid replace a generic circle search
+    mask = cv.inRange(image, BALL_COLOR_LOWER, BALL_COLOR_UPPER)
+    moments = cv.moments(mask, binaryImage=True)
+    if moments["m00"] > 0:
+        return (round(moments["m10"] / moments["m00"]), round(moments["m01"] / moments["m00"]))
+
+    return None
+
+
 class VideoReceiveTrack(MediaStreamTrack):
     """
     Custom video receiver for receiving and displaying video frames.
@@ -24,16 +48,21 @@ class VideoReceiveTrack(MediaStreamTrack):
 
     kind = "video"
 
-    def __init__(self, track, image_queue):
+    def __init__(self, track, executor, coordinate_queue, display=True):
         """
         Initialize the video receive track.
         Args:
             track: The underlying media track.
-            image_queue: A queue to store received image frames.
+            executor: The executor running the ball detection off the event loop.
+            coordinate_queue: A queue for storing coordinates of the ball.
+            display: Whether to show the received frames in a window.
         """
         super().__init__()
         self.track = track
-        self.image_queue = image_queue
+        self.executor = executor
+        self.coordinate_queue = coordinate_queue
+        self.display = display
+        self._busy = False
 
     def process_image(self, image):
         """
@@ -41,85 +70,54 @@ class VideoReceiveTrack(MediaStreamTrack):
         Args:
             image: The image frame to be processed.
         """
-        cv.imshow("Remote Stream", image)
-        cv.waitKey(10)
-        self.image_queue.put(image)
+        if self.display:
+            cv.imshow("Remote Stream", image)
+            cv.waitKey(1)
 
-    async def recv(self):
+    def put_coordinates(self, center):
         """
-        Receive a video frame.
-        Returns:
-            The received video frame.
+        Store the detected center, dropping the oldest coordinates if the queue is full.
+        Args:
+            center: (x, y) -> Tuple representing the center of ball
         """
-        frame = await self.track.recv()
-        image = frame.to_ndarray(format="bgr24")
-        self.process_image(image)
-        return frame
+        coordinates = {"x": center[0], "y": center[1]}
+        try:
+            self.coordinate_queue.put_nowait(coordinates)
+        except asyncio.QueueFull:
+            self.coordinate_queue.get_nowait()
+            self.coordinate_queue.put_nowait(coordinates)
 
-
-class ImageParser(mp.Process):
-    """
-    A multiprocessing process for parsing the image and computing the current location of the ball.
-    """
-
-    def __init__(self, image_queue, coordinate_queue):
+    def on_detected(self, future):
         """
-        Initialize the process.
+        Collect the result of a finished detection and accept the next frame.
         Args:
-            image_queue: A queue for receiving image frames.
-            coordinate_queue: A queue for storing coordinates of the ball.
+            future: The future returned by the executor.
         """
-        super().__init__()
-        self.image_queue = image_queue
-        self.coordinate_queue = coordinate_queue
-        self.current_x = mp.Value("i", 0)
-        self.current_y = mp.Value("i", 0)
+        self._busy = False
+        if future.cancelled():
+            return
+        center = future.result()
+        if center is not None:
+            self.put_coordinates(center)
 
-    def detect_center(self, image):
+    async def recv(self):
         """
-        Detect the center of the ball in the image
-        Args:
-            image: The image (ndarray) object
+        Receive a video frame.
         Returns:
-            (x, y) -> Tuple representing the center of ball
+            The received video frame.
         """
-        gray = cv.cvtColor(image, cv.COLOR_BGR2GRAY)
-        gray_blurred = cv.blur(gray, (3, 3))
-        detected_circles = cv.HoughCircles(
-            gray_blurred,
-            cv.HOUGH_GRADIENT,
-            1,
-            20,
-            param1=50,
-            param2=30,
-            minRadius=1,
-            maxRadius=40,
-        )
-
-        if detected_circles is not None:
-            x, y, _ = np.uint16(np.around(detected_circles))[0, :][0]
-            return (x, y)
-
-        return None
+        frame = await self.track.recv()
+        image = frame.to_ndarray(format="bgr24")
+        self.process_image(image)
 
-    def run(self):
-        """
-        Run the image parsing loop.
-        """
-        while True:
-            try:
-                image = self.image_queue.get()
-            except queue.Empty:
-                logger.debug("image queue is empty")
-
-            # extracting the center of the bouncing ball
-            center = self.detect_center(image)
-            if center is not None:
-                self.current_x.value = center[0]
-                self.current_y.value = center[1]
-                self.coordinate_queue.put(
-                    {"x": self.current_x.value, "y": self.current_y.value}
-                )
+        # OpenCV releases the GIL, so a worker thread avoids pickling the frame to a process.
+        # frames arriving while a detection is still running are skipped so the output stays current
+        if not self._busy:
+            self._busy = True
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self.executor, detect_center, image)
+            future.add_done_callback(self.on_detected)
+        return frame
 
 
 class Client:
@@ -127,12 +125,15 @@ class Client:
     The client class for video signaling.
     """
 
-    def __init__(self):
+    def __init__(self, display=True):
         """
-        Initialize the client with image queue, coordinate queue, and data channel.
+        Initialize the client with detection executor, coordinate queue, and data channel.
+        Args:
+            display: Whether to show the received frames in a window.
         """
-        self.image_queue = mp.Queue()
-        self.coordinate_queue = mp.Queue()
+        self.display = display
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.coordinate_queue = asyncio.Queue(maxsize=COORDINATE_QUEUE_SIZE)
         self.channel = None
 
     async def send_coordinates_to_server(self):
@@ -140,15 +141,23 @@ class Client:
         Send the computed coordinates to the server.
         """
         while True:
-            if (
-                self.channel
-                and self.channel.readyState == "open"
-                and not self.coordinate_queue.empty()
-            ):
-                coordinates = self.coordinate_queue.get()
-                logger.info(f"channel({self.channel.label}) > {coordinates}")
-                self.channel.send(str(coordinates))
-            await asyncio.sleep(0.01)  # Adjust the sleep duration as needed
+            # whatever else is already queued goes out in the same message
+            batch = [await self.coordinate_queue.get()]
+            while len(batch) < COORDINATE_QUEUE_SIZE and not self.coordinate_queue.empty():
+                batch.append(self.coordinate_queue.get_nowait())
+
+            if not self.channel or self.channel.readyState != "open":
+                continue
+            if self.channel.bufferedAmount > MAX_BUFFERED_AMOUNT:
+                # the records already buffered still go out first, this batch is dropped
+                logger.debug(f"channel({self.channel.label}) congested, dropping {batch}")
+            else:
+                logger.info(f"channel({self.channel.label}) > {batch}")
+                payload = b"".join(
+                    struct.pack(COORDINATE_FORMAT, coordinates["x"], coordinates["y"])
+                    for coordinates in batch
+                )
+                self.channel.send(payload)
 
     async def consume_signaling(self, peer_connection, signaling) -> None:
         """
@@ -186,7 +195,12 @@ class Client:
         def on_track(track):
             if track.kind == "video":
                 relay = MediaRelay()
-                video_track = VideoReceiveTrack(relay.subscribe(track), self.image_queue)
+                video_track = VideoReceiveTrack(
+                    relay.subscribe(track),
+                    self.executor,
+                    self.coordinate_queue,
+                    display=self.display,
+                )
                 peer_connection.addTrack(video_track)
 
         def on_datachannel(channel):
@@ -202,6 +216,9 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Client Command Line Interface")
     parser.add_argument("--signaling-host", default="127.0.0.1", help="signaling host")
     parser.add_argument("--signaling-port", default=8080, type=int, help="signaling port")
+    parser.add_argument(
+        "--no-display", dest="display", action="store_false", help="do not show the remote stream"
+    )
     parser.add_argument("--verbose", "-v", action="count")
     args = parser.parse_args()
 
@@ -214,14 +231,12 @@ if __name__ == "__main__":
     signaling = TcpSocketSignaling(args.signaling_host, args.signaling_port)
     peer_connection = RTCPeerConnection()
 
-    client = Client()
-
-    # start process_a for parsing the image and detecting the center of the ball
-    process_a = ImageParser(client.image_queue, client.coordinate_queue)
-    process_a.start()
+    client = Client(display=args.display)
 
     # create a new event loop and set it to current
-    loop = asyncio.new_event_loop()
+    import uvloop
+
+    loop = uvloop.new_event_loop()
     asyncio.set_event_loop(loop)
     try:
         # task to send the coordinates to the server on the main thread
@@ -233,3 +248,4 @@ if __name__ == "__main__":
     finally:
         loop.run_until_complete(peer_connection.close())
         loop.run_until_complete(signaling.close())
+        client.executor.shutdown()
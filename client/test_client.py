@@ -1,18 +1,19 @@
 import pytest
 import cv2 as cv
 from unittest.mock import MagicMock
-from client import VideoReceiveTrack, Client, ImageParser
+from client import VideoReceiveTrack, Client, detect_center
 import numpy as np
-import multiprocessing as mp
+import asyncio
+import struct
 
 @pytest.fixture
 def client():
     return Client()
 
 def test_client_initialization(client):
-    assert client.image_queue.empty()
     assert client.coordinate_queue.empty()
     assert client.channel is None
+    assert client.display
 
 def test_process_image(mocker):
     # Mock the cv.imshow and cv.waitKey functions
@@ -20,9 +21,8 @@ def test_process_image(mocker):
     mocker.patch.object(cv, "waitKey")
 
     # Create a VideoReceiveTrack instance
-    image_queue = mp.Queue()
     track = mocker.Mock()
-    video_track = VideoReceiveTrack(track, image_queue)
+    video_track = VideoReceiveTrack(track, mocker.Mock(), asyncio.Queue())
 
     # Mock an image frame
     image_frame = mocker.Mock()
@@ -33,25 +33,117 @@ def test_process_image(mocker):
 
     # Assert that cv.imshow and cv.waitKey were called with the correct arguments
     cv.imshow.assert_called_once_with("Remote Stream", image_frame.to_ndarray())
-    cv.waitKey.assert_called_once_with(10)
+    cv.waitKey.assert_called_once_with(1)
 
-    assert np.array_equal(image_queue.get(), image_frame.to_ndarray())
+def test_process_image_without_display(mocker):
+    mocker.patch.object(cv, "imshow")
+    mocker.patch.object(cv, "waitKey")
+    video_track = VideoReceiveTrack(mocker.Mock(), mocker.Mock(), asyncio.Queue(), display=False)
+
+    video_track.process_image(np.zeros((100, 100, 3), dtype=np.uint8))
+
+    assert not cv.imshow.called
+    assert not cv.waitKey.called
+
+def test_put_coordinates_drops_oldest(mocker):
+    coordinate_queue = asyncio.Queue(maxsize=1)
+    video_track = VideoReceiveTrack(mocker.Mock(), mocker.Mock(), coordinate_queue)
+
+    video_track.put_coordinates((10, 20))
+    video_track.put_coordinates((30, 40))
+
+    assert coordinate_queue.get_nowait() == {"x": 30, "y": 40}
+    assert coordinate_queue.empty()
+
+@pytest.mark.asyncio
+async def test_recv_skips_frames_while_detecting(mocker):
+    executor = mocker.Mock()
+    track = mocker.AsyncMock()
+    track.recv.return_value.to_ndarray.return_value = np.zeros((100, 100, 3), dtype=np.uint8)
+    video_track = VideoReceiveTrack(track, executor, asyncio.Queue())
+    mocker.patch.object(video_track, "process_image")
+    run_in_executor = mocker.patch.object(
+        asyncio.get_running_loop(), "run_in_executor", return_value=asyncio.Future()
+    )
+
+    await video_track.recv()
+    await video_track.recv()
+
+    run_in_executor.assert_called_once()
 
 def test_detect_center():
-    image_queue = mp.Queue()
-    coordinate_queue = mp.Queue()
-    image_parser = ImageParser(image_queue, coordinate_queue)
     image_frame = np.zeros((100, 100, 3), dtype=np.uint8)
-    center = image_parser.detect_center(image_frame)
+    center = detect_center(image_frame)
     assert center is None
 
-def test_send_coordinates_to_server(client):
+def test_detect_center_red_ball():
+    image_frame = np.full((480, 640, 3), 255, dtype=np.uint8)
+    cv.circle(image_frame, (200, 150), 20, (0, 0, 255), -1)
+    assert detect_center(image_frame) == (200, 150)
+
+@pytest.mark.asyncio
+async def test_send_coordinates_to_server(client):
+    client.channel = MagicMock()
+    client.channel.readyState = "open"
+    client.channel.bufferedAmount = 0
+    sender = asyncio.ensure_future(client.send_coordinates_to_server())
+
+    # the sender blocks on the queue until a coordinate is available
+    await asyncio.sleep(0)
+    assert not client.channel.send.called
+
+    client.coordinate_queue.put_nowait({"x": 10, "y": 20})
+    await asyncio.sleep(0)
+    sender.cancel()
+
+    client.channel.send.assert_called_once_with(struct.pack("<ii", 10, 20))
+
+@pytest.mark.asyncio
+async def test_send_coordinates_to_server_batches_queued(client):
+    client.channel = MagicMock()
+    client.channel.readyState = "open"
+    client.channel.bufferedAmount = 0
+    client.coordinate_queue.put_nowait({"x": 10, "y": 20})
+    client.coordinate_queue.put_nowait({"x": 30, "y": 40})
+    sender = asyncio.ensure_future(client.send_coordinates_to_server())
+
+    await asyncio.sleep(0)
+    sender.cancel()
+
+    client.channel.send.assert_called_once_with(struct.pack("<iiii", 10, 20, 30, 40))
+
+@pytest.mark.asyncio
+async def test_send_coordinates_to_server_skips_congested_channel(client):
     client.channel = MagicMock()
     client.channel.readyState = "open"
-    client.coordinate_queue.put({"x": 10, "y": 20})
-    client.send_coordinates_to_server()
+    client.channel.bufferedAmount = 1 << 20
+    sender = asyncio.ensure_future(client.send_coordinates_to_server())
+
+    client.coordinate_queue.put_nowait({"x": 10, "y": 20})
+    await asyncio.sleep(0)
+    sender.cancel()
+
+    assert not client.channel.send.called
+    assert client.coordinate_queue.empty()
+
+@pytest.mark.asyncio
+async def test_send_coordinates_to_server_resumes_after_congestion(client):
+    client.channel = MagicMock()
+    client.channel.readyState = "open"
+    client.channel.bufferedAmount = 1 << 20
+    sender = asyncio.ensure_future(client.send_coordinates_to_server())
+
+    client.coordinate_queue.put_nowait({"x": 10, "y": 20})
+    await asyncio.sleep(0)
+    assert not client.channel.send.called
+
+    # once the channel drains below the limit, new coordinates are sent again
+    client.channel.bufferedAmount = 0
+    client.coordinate_queue.put_nowait({"x": 30, "y": 40})
+    await asyncio.sleep(0)
+    sender.cancel()
 
-    assert client.channel.send.called_with('{"x": 10, "y": 20}')
+    client.channel.send.assert_called_once_with(struct.pack("<ii", 30, 40))
 
 if __name__ == "__main__":
     pytest.main()
@@ -1,12 +1,14 @@
 import argparse
 import logging
+import logging.handlers
+import queue
 import asyncio
 import math
-import ast
 import cv2 as cv
 import numpy as np
 import fractions
 import time
+import struct
 from aiortc import (
     MediaStreamTrack,
     RTCPeerConnection,
@@ -16,11 +18,12 @@ from aiortc import (
 from aiortc.contrib.signaling import BYE, TcpSocketSignaling
 from av import VideoFrame
 
-SCREEN_HEIGHT = 640
-SCREEN_WIDTH = 480
+FRAME_W = 640
+FRAME_H = 480
 VIDEO_CLOCK_RATE = 90000
 VIDEO_PTIME = 1 / 30  # 30fps
 VIDEO_TIME_BASE = fractions.Fraction(1, VIDEO_CLOCK_RATE)
+COORDINATE_FORMAT = "<ii"
 
 logger = logging.getLogger("server")
 
@@ -35,24 +38,38 @@ class BouncingBallTrack(MediaStreamTrack):
     def __init__(self):
         super().__init__()
 
-        self.screen_size = (SCREEN_HEIGHT, SCREEN_WIDTH)
-        self.position_x = self.screen_size[0] // 2
-        self.position_y = self.screen_size[1] // 2
+        self.frame_width = FRAME_W
+        self.frame_height = FRAME_H
+        self.position_x = self.frame_width // 2
+        self.position_y = self.frame_height // 2
         self.speed_x = 1
         self.speed_y = 1
 
         self.ball_radius = 20
         self.ball_color = (0, 0, 255)
 
+        # the ball is drawn straight into the pixel buffer of a single VideoFrame, and since the
+        # background never changes only the area around the ball is repainted per frame
+        self._av_frame = VideoFrame(self.frame_width, self.frame_height, "bgr24")
+        plane = self._av_frame.planes[0]
+        self._frame = np.ndarray(
+            (self.frame_height, self.frame_width, 3),
+            dtype="uint8",
+            buffer=plane,
+            strides=(plane.line_size, 3, 1),
+        )
+        self._frame.fill(255)
+        self._prev_pos = None
+
     def update_delta_with_bound(self):
         """
         Update the ball's position and direction based on the screen boundaries.
         """
-        if self.position_x + self.ball_radius >= self.screen_size[0]:
+        if self.position_x + self.ball_radius >= self.frame_width:
             self.speed_x *= -1
         elif self.position_x - self.ball_radius <= 0:
             self.speed_x *= -1
-        if self.position_y + self.ball_radius >= self.screen_size[1]:
+        if self.position_y + self.ball_radius >= self.frame_height:
             self.speed_y *= -1
         elif self.position_y - self.ball_radius <= 0:
             self.speed_y *= -1
@@ -61,10 +78,13 @@ class BouncingBallTrack(MediaStreamTrack):
         """
         Generate the next image with the bouncing ball.
         """
-        frame = np.full((self.screen_size[1], self.screen_size[0], 3), 255, dtype="uint8")
+        frame = self._frame
+        if self._prev_pos is not None:
+            cv.circle(frame, self._prev_pos, self.ball_radius + 1, (255, 255, 255), -1)
         self.position_x += self.speed_x
         self.position_y += self.speed_y
         cv.circle(frame, (self.position_x, self.position_y), self.ball_radius, self.ball_color, -1)
+        self._prev_pos = (self.position_x, self.position_y)
         self.update_delta_with_bound()
         return frame
 
@@ -85,8 +105,8 @@ class BouncingBallTrack(MediaStreamTrack):
         """
         Receive the next video frame.
         """
-        next_img = self.get_next_image()
-        next_frame = VideoFrame.from_ndarray(next_img, format="bgr24")
+        self.get_next_image()
+        next_frame = self._av_frame
 
         pts, time_base = await self.next_timestamp()
         next_frame.pts = pts
@@ -118,6 +138,20 @@ class Server:
             elif obj is BYE:
                 break
     
+    def decode_coordinates(self, message):
+        """
+        Decode the coordinates batched by the client into one message.
+        Args:
+            message: Bytes holding consecutive COORDINATE_FORMAT records.
+        Returns:
+            List of dictionaries with x and y coordinates, empty if the message is malformed.
+        """
+        try:
+            return [{"x": x, "y": y} for x, y in struct.iter_unpack(COORDINATE_FORMAT, message)]
+        except struct.error:
+            logger.debug(f"dropping malformed coordinate message of {len(message)} bytes")
+            return []
+
     def compute_error(self, balltrack, client_coordinate):
         """
         Calculates distance between the actual location of the ball and coordinates sent by the client.
@@ -129,7 +163,7 @@ class Server:
         """
         actual_x = balltrack.position_x
         actual_y = balltrack.position_y
-        distance = math.sqrt((client_coordinate["x"] - actual_x) ** 2 + (client_coordinate["y"] - actual_y) ** 2)
+        distance = math.hypot(client_coordinate["x"] - actual_x, client_coordinate["y"] - actual_y)
         logger.info(f"current coordinates > x: {actual_x}, y: {actual_y}. computed error: {distance} \n ------------------")
         return distance
 
@@ -152,10 +186,10 @@ class Server:
         @channel.on("message")
         def on_message(message):
             # message received from the client, compute error
-            if isinstance(message, str):
-                client_coordinate = ast.literal_eval(message)
-                logger.info(f"channel({channel.label}) < {client_coordinate}")
-                self.compute_error(balltrack, client_coordinate)                
+            if isinstance(message, bytes):
+                for client_coordinate in self.decode_coordinates(message):
+                    logger.info(f"channel({channel.label}) < {client_coordinate}")
+                    self.compute_error(balltrack, client_coordinate)
 
         # create offer and send it to the client
         await peer_connection.setLocalDescription(await peer_connection.createOffer())
@@ -170,10 +204,15 @@ if __name__ == "__main__":
     parser.add_argument("--verbose", "-v", action="count")
     args = parser.parse_args()
 
+    # records are handed to a background thread so log I/O never blocks the event loop
+    log_queue = queue.SimpleQueue()
+    log_handlers = [logging.handlers.QueueHandler(log_queue)]
     if args.verbose:
-        logging.basicConfig(level=logging.DEBUG)
+        logging.basicConfig(level=logging.DEBUG, handlers=log_handlers)
     else:
-        logging.basicConfig(level=logging.INFO)
+        logging.basicConfig(level=logging.INFO, handlers=log_handlers)
+    log_listener = logging.handlers.QueueListener(log_queue, logging.StreamHandler())
+    log_listener.start()
 
     # create signaling and peer connection
     signaling = TcpSocketSignaling(args.signaling_host, args.signaling_port)
@@ -182,7 +221,9 @@ if __name__ == "__main__":
     server = Server()
 
     # create a new event loop and set it to current
-    loop = asyncio.new_event_loop()
+    import uvloop
+
+    loop = uvloop.new_event_loop()
     asyncio.set_event_loop(loop)
     try:
         # future to send the images to the client and get back the computed coordinates
@@ -192,3 +233,4 @@ if __name__ == "__main__":
     finally:
         loop.run_until_complete(peer_connection.close())
         loop.run_until_complete(signaling.close())
+        log_listener.stop()
@@ -1,8 +1,9 @@
 import pytest
 from av import VideoFrame
-from server import BouncingBallTrack, Server
+from server import BouncingBallTrack, Server, FRAME_W, FRAME_H, COORDINATE_FORMAT
 import numpy as np
 import math
+import struct
 
 @pytest.mark.asyncio
 async def test_BouncingBallTrack_recv():
@@ -13,6 +14,12 @@ async def test_BouncingBallTrack_recv():
     assert isinstance(received_frame.width, int)
     assert isinstance(received_frame.height, int)
     assert isinstance(received_frame, VideoFrame)
+    assert (received_frame.width, received_frame.height) == (FRAME_W, FRAME_H)
+
+    # the returned frame shares its pixels with the drawing buffer
+    assert received_frame is track._av_frame
+    track._frame[0, 0] = (1, 2, 3)
+    assert tuple(received_frame.to_ndarray(format="bgr24")[0, 0]) == (1, 2, 3)
 
 def test_BouncingBallTrack_get_next_image():
     track = BouncingBallTrack()
@@ -20,6 +27,23 @@ def test_BouncingBallTrack_get_next_image():
     received_frame = track.get_next_image()
     assert isinstance(received_frame, np.ndarray)
 
+def test_BouncingBallTrack_get_next_image_reuses_buffer():
+    track = BouncingBallTrack()
+
+    # frames are drawn in place, nothing is allocated per frame
+    assert track.get_next_image() is track.get_next_image()
+
+def test_BouncingBallTrack_get_next_image_erases_previous_ball():
+    track = BouncingBallTrack()
+    first_x, first_y = track.position_x + track.speed_x, track.position_y + track.speed_y
+
+    for _ in range(track.ball_radius * 3):
+        frame = track.get_next_image()
+
+    # the previous ball position is repainted white and only the current ball remains
+    assert (frame[first_y, first_x] == 255).all()
+    assert tuple(frame[track.position_y, track.position_x]) == track.ball_color
+
 def test_Server_compute_error():
     server = Server()
     balltrack = BouncingBallTrack()
@@ -27,7 +51,7 @@ def test_Server_compute_error():
     # Test case 1: Client coordinate at (0, 0)
     client_coordinate = {"x": 0, "y": 0}
     distance = server.compute_error(balltrack, client_coordinate)
-    assert distance == math.sqrt(balltrack.position_x ** 2 + balltrack.position_y ** 2)
+    assert distance == pytest.approx(math.sqrt(balltrack.position_x ** 2 + balltrack.position_y ** 2))
 
     # Test case 2: Client coordinate at (10, 20)
     client_coordinate = {"x": 10, "y": 20}
@@ -35,7 +59,21 @@ def test_Server_compute_error():
     actual_y = balltrack.position_y
     expected_distance = math.sqrt((client_coordinate["x"] - actual_x) ** 2 + (client_coordinate["y"] - actual_y) ** 2)
     distance = server.compute_error(balltrack, client_coordinate)
-    assert distance == expected_distance
+    assert distance == pytest.approx(expected_distance)
+
+def test_Server_decode_coordinates():
+    server = Server()
+
+    assert server.decode_coordinates(struct.pack(COORDINATE_FORMAT, 10, 20)) == [{"x": 10, "y": 20}]
+
+    message = struct.pack(COORDINATE_FORMAT, 10, 20) + struct.pack(COORDINATE_FORMAT, -30, 40)
+    assert server.decode_coordinates(message) == [{"x": 10, "y": 20}, {"x": -30, "y": 40}]
+
+def test_Server_decode_coordinates_truncated():
+    server = Server()
+
+    message = struct.pack(COORDINATE_FORMAT, 10, 20) + b"\x01\x02\x03"
+    assert server.decode_coordinates(message) == []
 
 
 if __name__ == "__main__":